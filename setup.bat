@@ -68,6 +68,6 @@ echo 1. Edit .env and add your OpenAI API key and Assistant ID
 echo 2. Activate the virtual environment:
 echo    venv\Scripts\activate
 echo 3. Run the batch processor:
-echo    python -m src.run_batch
+echo    python -m src.generate_answers
 echo.
 pause
@@ -6,29 +6,21 @@ Clean up topic files - remove leading numbers from questions.
 import re
 from pathlib import Path
 
+# Leading question numbers like "1. ", "10. " (whitespace may run to the end
+# of the line, but never into the next line, matching the per-line cleanup)
+LEADING_NUMBER_RE = re.compile(r'^\d+\.(?:[^\S\n]*\n|[^\S\n]+)', re.MULTILINE)
+
 def clean_file(file_path):
     """Remove leading numbers (like '1. ', '10. ') from questions."""
     print(f"Cleaning: {file_path.name}")
     
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    cleaned_lines = []
-    changes_made = 0
+    text = file_path.read_text(encoding='utf-8')
     
-    for line in lines:
-        # Remove leading numbers like "1. ", "10. ", etc.
-        original = line
-        cleaned = re.sub(r'^\d+\.\s+', '', line)
-        
-        if cleaned != original:
-            changes_made += 1
-        
-        cleaned_lines.append(cleaned)
+    # Remove leading numbers like "1. ", "10. ", etc. in a single pass
+    cleaned, changes_made = LEADING_NUMBER_RE.subn('', text)
     
     # Write back to file
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.writelines(cleaned_lines)
+    file_path.write_text(cleaned, encoding='utf-8')
     
     print(f"  ✓ Removed {changes_made} question numbers\n")
     return changes_made
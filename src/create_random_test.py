@@ -12,6 +12,24 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.run_batch import parse_input_file
 
+# Gender header line for each gender
+GENDER_HEADERS = {
+    "Female": "💗 Female",
+    "Male": "🩵 Male",
+    "Gender Neutral": "💚 Gender Neutral",
+}
+
+# (care_focus, has_kids, gender) -> context emoji; None matches any gender
+CONTEXT_EMOJIS = {
+    ("Myself", "No", None): "🩺",
+    ("Myself", "Yes", "Female"): "👩‍👧",
+    ("Myself", "Yes", "Male"): "👨‍👧",
+    ("My Kids", "Yes", None): "👶",
+    ("My Family", "No", None): "🏡",
+    ("My Family", "Yes", None): "💞",
+}
+DEFAULT_CONTEXT_EMOJI = "💬"
+
 def create_random_test_file():
     """Create a test file with one random question from each topic file."""
     data_dir = Path(__file__).parent.parent / "data"
@@ -31,12 +49,11 @@ def create_random_test_file():
     print("=" * 60)
     print()
     
-    output_lines = []
+    topic_blocks = []
     selected_questions = []
     
     # Track what we've used to ensure diversity
-    used_genders = []
-    used_contexts = []
+    used_contexts = set()
     
     for topic_file in topic_files:
         # Parse the file to get all questions
@@ -48,33 +65,23 @@ def create_random_test_file():
         
         # Try to select a question with diverse gender/context
         # Prioritize combinations we haven't used yet
-        selected = None
-        attempts = 0
-        max_attempts = 50
+        random.shuffle(all_records)
         
-        while attempts < max_attempts:
-            candidate = random.choice(all_records)
-            gender_context = (candidate['gender'], candidate['care_focus'], candidate['has_kids'])
-            
-            # If we have fewer than 3 selections, just pick anything
-            if len(selected_questions) < 3:
-                selected = candidate
-                break
-            
-            # Try to find something we haven't used
-            if gender_context not in used_contexts:
-                selected = candidate
-                break
-            
-            attempts += 1
-        
-        # If we couldn't find a unique combo after many attempts, just use the last candidate
-        if selected is None:
-            selected = candidate
+        # If we have fewer than 3 selections, just pick anything
+        if len(selected_questions) < 3:
+            selected = all_records[0]
+        else:
+            # First shuffled record with an unused combo, else any record
+            selected = next(
+                (
+                    r for r in all_records
+                    if (r['gender'], r['care_focus'], r['has_kids']) not in used_contexts
+                ),
+                all_records[0]
+            )
         
         # Track what we've used
-        used_genders.append(selected['gender'])
-        used_contexts.append((selected['gender'], selected['care_focus'], selected['has_kids']))
+        used_contexts.add((selected['gender'], selected['care_focus'], selected['has_kids']))
         selected_questions.append(selected)
         
         print(f"✓ Selected from {topic_file.name}:")
@@ -83,50 +90,31 @@ def create_random_test_file():
         print(f"  Question: {selected['question'][:60]}...")
         print()
         
-        # Build the output format
-        topic_line = f"Topic {len(selected_questions)}: {selected['topic']}\n"
-        output_lines.append(topic_line)
-        output_lines.append("\n")
-        
-        # Add gender emoji
-        if selected['gender'] == "Female":
-            output_lines.append("💗 Female\n")
-        elif selected['gender'] == "Male":
-            output_lines.append("🩵 Male\n")
-        else:  # Gender Neutral
-            output_lines.append("💚 Gender Neutral\n")
-        output_lines.append("\n")
-        
         # Add context header
-        if selected['care_focus'] == "Myself" and selected['has_kids'] == "No":
-            context_emoji = "🩺"
-        elif selected['care_focus'] == "Myself" and selected['has_kids'] == "Yes":
-            context_emoji = "👩‍👧" if selected['gender'] == "Female" else "👨‍👧" if selected['gender'] == "Male" else "💬"
-        elif selected['care_focus'] == "My Kids":
-            context_emoji = "👶"
-        elif selected['care_focus'] == "My Family" and selected['has_kids'] == "No":
-            context_emoji = "🏡"
-        elif selected['care_focus'] == "My Family" and selected['has_kids'] == "Yes":
-            context_emoji = "💞"
-        else:
-            context_emoji = "💬"
+        context_key = (selected['care_focus'], selected['has_kids'])
+        context_emoji = CONTEXT_EMOJIS.get(
+            (*context_key, selected['gender']),
+            CONTEXT_EMOJIS.get((*context_key, None), DEFAULT_CONTEXT_EMOJI)
+        )
         
         care_text = selected['care_focus']
         kids_text = f" ({'With' if selected['has_kids'] == 'Yes' else 'No'} Kids)"
         if selected['care_focus'] != "My Kids":
-            context_line = f"{context_emoji} {care_text}{kids_text}\n"
+            context_line = f"{context_emoji} {care_text}{kids_text}"
         else:
-            context_line = f"{context_emoji} {care_text}\n"
+            context_line = f"{context_emoji} {care_text}"
         
-        output_lines.append(context_line)
-        output_lines.append(f"{selected['question']}\n")
-        output_lines.append("\n")
-        output_lines.append("\n")
+        # Build the output format as one block per topic
+        topic_blocks.append(
+            f"Topic {len(selected_questions)}: {selected['topic']}\n\n"
+            f"{GENDER_HEADERS[selected['gender']]}\n\n"
+            f"{context_line}\n"
+            f"{selected['question']}\n\n\n"
+        )
     
     # Write to output file
     output_file = data_dir / "10_random_test.txt"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.writelines(output_lines)
+    output_file.write_text("".join(topic_blocks), encoding='utf-8')
     
     print("=" * 60)
     print(f"✓ Created: {output_file.name}")
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 """
 Interactive script - lets you select which topic file to process.
+Topic files can also be selected on the command line (--file / --all).
 Outputs are saved to outputs/ folder with timestamp.
 """
 
 import sys
 import os
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -19,6 +24,38 @@ load_dotenv()
 # Import the batch processor
 from src import run_batch
 
+def parse_args():
+    """Parse command line options for non-interactive use."""
+    parser = argparse.ArgumentParser(
+        description="Generate answers for health topic files."
+    )
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument(
+        "--file",
+        type=int,
+        nargs="+",
+        metavar="N",
+        help="Process the topic file(s) with these menu numbers"
+    )
+    selection.add_argument(
+        "--all",
+        action="store_true",
+        help="Process every topic file in data/"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of topic files to process in parallel (default 1)"
+    )
+    args = parser.parse_args()
+    
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    
+    return args
+
 def list_topic_files():
     """List all topic files in data/ folder."""
     data_dir = Path(__file__).parent.parent / "data"
@@ -71,8 +108,30 @@ def create_output_filename(input_file: Path):
     
     return output_filename
 
+def process_file(
+    selected_file: Path,
+    outputs_dir: Path,
+    cancel_event: Optional[threading.Event] = None
+):
+    """Run the batch processor for one topic file."""
+    # Create output filename
+    output_filename = create_output_filename(selected_file)
+    output_path = outputs_dir / output_filename
+    
+    print()
+    print("=" * 70)
+    print(f"Processing: {selected_file.name}")
+    print(f"Output to:  outputs/{output_filename}")
+    print("=" * 70)
+    print()
+    
+    # Run the batch processor
+    run_batch.main(selected_file, output_path, cancel_event)
+
 def main():
     """Main interactive function."""
+    args = parse_args()
+    
     # Get base directory
     base_dir = Path(__file__).parent.parent
     
@@ -87,37 +146,55 @@ def main():
         print("❌ No topic files found in data/ folder")
         sys.exit(1)
     
-    # Display menu
-    display_menu(topic_files)
-    
-    # Get user choice
-    choice = get_user_choice(len(topic_files))
-    
-    if choice == 0:
-        print("Exiting...")
-        sys.exit(0)
-    
-    # Get selected file (adjust for 0-based indexing)
-    selected_file = topic_files[choice - 1]
-    
-    # Create output filename
-    output_filename = create_output_filename(selected_file)
-    output_path = outputs_dir / output_filename
-    
-    print()
-    print("=" * 70)
-    print(f"Processing: {selected_file.name}")
-    print(f"Output to:  outputs/{output_filename}")
-    print("=" * 70)
-    print()
-    
-    # Override run_batch file paths
-    run_batch.INPUT_FILE = selected_file
-    run_batch.OUTPUT_FILE = output_path
+    if args.all:
+        selected_files = topic_files
+    elif args.file:
+        invalid = [n for n in args.file if not 1 <= n <= len(topic_files)]
+        if invalid:
+            print(f"❌ Invalid file number(s): {', '.join(map(str, invalid))} "
+                  f"(choose 1-{len(topic_files)})")
+            sys.exit(1)
+        # Adjust for 0-based indexing; drop repeats (keeping order) so two
+        # workers never write the same timestamped output file
+        selected_files = [topic_files[n - 1] for n in dict.fromkeys(args.file)]
+    else:
+        # Display menu
+        display_menu(topic_files)
+        
+        # Get user choice
+        choice = get_user_choice(len(topic_files))
+        
+        if choice == 0:
+            print("Exiting...")
+            sys.exit(0)
+        
+        # Get selected file (adjust for 0-based indexing)
+        selected_files = [topic_files[choice - 1]]
     
-    # Run the batch processor
     try:
-        run_batch.main()
+        if args.workers > 1 and len(selected_files) > 1:
+            # Each file runs its own batch (and event loop) in a worker thread
+            cancel_event = threading.Event()
+            executor = ThreadPoolExecutor(max_workers=args.workers)
+            futures = [
+                executor.submit(process_file, f, outputs_dir, cancel_event)
+                for f in selected_files
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # Drop queued files and tell running batches to stop now,
+                # instead of waiting for them to finish (e.g. on Ctrl-C)
+                cancel_event.set()
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                executor.shutdown(wait=False)
+        else:
+            for selected_file in selected_files:
+                process_file(selected_file, outputs_dir)
     except KeyboardInterrupt:
         print("\n\n❌ Processing interrupted by user")
         sys.exit(1)
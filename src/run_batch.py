@@ -6,12 +6,21 @@ Reads structured questions from data/topics.txt and writes responses to outputs.
 
 import os
 import csv
-import time
+import asyncio
+import argparse
+import queue
+import threading
 import re
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, TextIO
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    RateLimitError,
+    InternalServerError,
+)
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 
@@ -23,13 +32,50 @@ ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 if not OPENAI_API_KEY or not ASSISTANT_ID:
     raise ValueError("Missing OPENAI_API_KEY or ASSISTANT_ID in .env file")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Maximum number of questions processed concurrently
+CONCURRENCY = os.getenv("CONCURRENCY", "8").strip()
+if not CONCURRENCY.isdigit() or int(CONCURRENCY) < 1:
+    raise ValueError(f"CONCURRENCY must be a whole number of at least 1 (got {CONCURRENCY!r})")
+CONCURRENCY = int(CONCURRENCY)
+
+# Run polling (seconds): exponential backoff between polls, 5 minutes max per run
+POLL_MIN_DELAY = 0.25
+POLL_MAX_DELAY = 5.0
+POLL_BACKOFF = 1.7
+RUN_TIMEOUT = 300
 
-# File paths (must be set by caller before calling main())
 BASE_DIR = Path(__file__).parent.parent
-INPUT_FILE = None
-OUTPUT_FILE = None
+
+# Output CSV columns
+FIELDNAMES = [
+    'topic', 'gender', 'care_focus', 'has_kids', 'role',
+    'prompt', 'question', 'response', 'thread_id', 'run_id', 'status', 'error'
+]
+
+# Input line patterns
+TOPIC_RE = re.compile(r"Topic \d+:\s*(.+)")
+NUMBER_PREFIX_RE = re.compile(r"^\d+\.\s*")
+CONTEXT_EMOJIS = ["🩺", "👩‍👧", "👨‍👧", "👶", "🏡", "💞", "💬"]
+CONTEXT_RE = re.compile(r"(Myself|My Kids|My Family)(?: \((With|No) Kids\))?")
+
+# (care focus, "With"/"No" from the header) -> has_kids
+CONTEXT_HAS_KIDS = {
+    ("Myself", "No"): "No",
+    ("Myself", "With"): "Yes",
+    ("My Kids", None): "Yes",  # Implicit if you have kids
+    ("My Family", "No"): "No",
+    ("My Family", "With"): "Yes",
+}
+
+# Gender header emoji -> gender
+GENDER_EMOJIS = {"💗": "Female", "🩵": "Male", "💚": "Gender Neutral"}
+
+# First character of a line -> line kind (anything else is a question)
+LINE_KINDS = {
+    "T": "topic",
+    **{emoji: "gender" for emoji in GENDER_EMOJIS},
+    **{emoji[0]: "context" for emoji in CONTEXT_EMOJIS},
+}
 
 # Response template
 RESPONSE_TEMPLATE = """
@@ -54,6 +100,14 @@ Users Question:
 {question}"""
 
 
+def line_kind(line: str) -> str:
+    """Classify a non-empty stripped line by its first character."""
+    kind = LINE_KINDS.get(line[0], "question")
+    if kind == "topic" and not line.startswith("Topic "):
+        return "question"
+    return kind
+
+
 def parse_input_file(file_path: Path) -> List[Dict[str, str]]:
     """
     Parse the topics.txt file into structured records.
@@ -68,8 +122,7 @@ def parse_input_file(file_path: Path) -> List[Dict[str, str]]:
     """
     records = []
     
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    lines = file_path.read_text(encoding='utf-8').splitlines()
     
     # State tracking
     current_topic = None
@@ -84,23 +137,17 @@ def parse_input_file(file_path: Path) -> List[Dict[str, str]]:
         if not line:
             continue
         
+        kind = line_kind(line)
+        
         # Topic line: "Topic 1: Energy & Fatigue"
-        if line.startswith("Topic "):
-            match = re.match(r"Topic \d+:\s*(.+)", line)
+        if kind == "topic":
+            match = TOPIC_RE.match(line)
             if match:
                 current_topic = match.group(1).strip()
-            continue
         
-        # Gender headers
-        if line.startswith("💗") and "Female" in line:
-            current_gender = "Female"
-            continue
-        elif line.startswith("🩵") and "Male" in line:
-            current_gender = "Male"
-            continue
-        elif line.startswith("💚") and "Gender Neutral" in line:
-            current_gender = "Gender Neutral"
-            continue
+        # Gender headers: 💗 Female, 🩵 Male, 💚 Gender Neutral
+        elif kind == "gender":
+            current_gender = GENDER_EMOJIS[line[0]]
         
         # Context headers (care focus + has_kids)
         # 🩺 Myself (No Kids)
@@ -109,30 +156,19 @@ def parse_input_file(file_path: Path) -> List[Dict[str, str]]:
         # 🏡 My Family (No Kids)
         # 💞 My Family (With Kids)
         # 💬 Generic emoji for Gender Neutral
-        
-        if any(emoji in line for emoji in ["🩺", "👩‍👧", "👨‍👧", "👶", "🏡", "💞", "💬"]):
+        elif kind == "context":
             # Extract care focus and has_kids from the line
-            if "Myself (No Kids)" in line:
-                current_care_focus = "Myself"
-                current_has_kids = "No"
-            elif "Myself (With Kids)" in line:
-                current_care_focus = "Myself"
-                current_has_kids = "Yes"
-            elif "My Kids" in line:
-                current_care_focus = "My Kids"
-                current_has_kids = "Yes"  # Implicit if you have kids
-            elif "My Family (No Kids)" in line:
-                current_care_focus = "My Family"
-                current_has_kids = "No"
-            elif "My Family (With Kids)" in line:
-                current_care_focus = "My Family"
-                current_has_kids = "Yes"
-            continue
+            match = CONTEXT_RE.search(line)
+            if match:
+                has_kids = CONTEXT_HAS_KIDS.get(match.groups())
+                if has_kids:
+                    current_care_focus = match.group(1)
+                    current_has_kids = has_kids
         
         # If we have all context set, this is a question line
-        if current_topic and current_gender and current_care_focus and current_has_kids:
+        elif current_topic and current_gender and current_care_focus and current_has_kids:
             # Strip leading numbers like "4." or "10."
-            question = re.sub(r"^\d+\.\s*", "", line).strip()
+            question = NUMBER_PREFIX_RE.sub("", line).strip()
             
             if question:
                 # Infer role
@@ -150,6 +186,7 @@ def parse_input_file(file_path: Path) -> List[Dict[str, str]]:
     return records
 
 
+@lru_cache(maxsize=16)
 def infer_role(gender: str, has_kids: str) -> str:
     """Infer role from gender and has_kids status."""
     if has_kids == "Yes":
@@ -162,15 +199,29 @@ def infer_role(gender: str, has_kids: str) -> str:
     return "individual"
 
 
+@lru_cache(maxsize=None)
+def build_context_summary(
+    topic: str, gender: str, care_focus: str, has_kids: str, role: str
+) -> str:
+    """Build the context prefix shared by all questions in the same section."""
+    return (
+        f"Context:\n"
+        f"• Topic: {topic}\n"
+        f"• Gender: {gender}\n"
+        f"• Care focus: {care_focus}\n"
+        f"• Has kids: {has_kids}\n"
+        f"• Inferred role: {role}\n\n"
+    )
+
+
 def build_message(record: Dict[str, str]) -> str:
     """Build the user message to send to the assistant."""
-    context_summary = (
-        f"Context:\n"
-        f"• Topic: {record['topic']}\n"
-        f"• Gender: {record['gender']}\n"
-        f"• Care focus: {record['care_focus']}\n"
-        f"• Has kids: {record['has_kids']}\n"
-        f"• Inferred role: {record['role']}\n\n"
+    context_summary = build_context_summary(
+        record['topic'],
+        record['gender'],
+        record['care_focus'],
+        record['has_kids'],
+        record['role']
     )
     
     template_filled = RESPONSE_TEMPLATE.format(
@@ -180,15 +231,62 @@ def build_message(record: Dict[str, str]) -> str:
     return context_summary + template_filled
 
 
-@retry(
-    retry=retry_if_exception_type((Exception,)),
+# Only transient API errors are retried; auth/4xx errors fail fast.
+# APIConnectionError also covers APITimeoutError (its subclass).
+retry_transient = retry(
+    retry=retry_if_exception_type((
+        APIConnectionError,
+        RateLimitError,
+        InternalServerError,
+    )),
     wait=wait_exponential(multiplier=1, min=2, max=60),
     stop=stop_after_attempt(5)
 )
-def call_assistant_api(message: str) -> Dict[str, str]:
+
+
+@retry_transient
+async def start_run(client: AsyncOpenAI, message: str):
+    """
+    Create a thread with the user message and start the run in one call.
+    
+    A retry after a dropped connection can still create a duplicate run if
+    the first request reached the server.
+    """
+    return await client.beta.threads.create_and_run(
+        assistant_id=ASSISTANT_ID,
+        thread={
+            "messages": [{"role": "user", "content": message}]
+        }
+    )
+
+
+@retry_transient
+async def get_run(client: AsyncOpenAI, thread_id: str, run_id: str):
+    """Fetch the current state of a run."""
+    return await client.beta.threads.runs.retrieve(
+        thread_id=thread_id,
+        run_id=run_id
+    )
+
+
+@retry_transient
+async def get_latest_message(client: AsyncOpenAI, thread_id: str, run_id: str):
+    """Fetch only the latest message produced by a run."""
+    return await client.beta.threads.messages.list(
+        thread_id=thread_id,
+        run_id=run_id,
+        order="desc",
+        limit=1
+    )
+
+
+async def call_assistant_api(client: AsyncOpenAI, message: str) -> Dict[str, str]:
     """
     Call OpenAI Assistants API with retry logic.
     
+    Each request is retried on its own, so a transient error while polling
+    retries that poll instead of starting a second thread and run.
+    
     Returns dict with:
     - response: str (assistant's text reply)
     - thread_id: str
@@ -197,54 +295,40 @@ def call_assistant_api(message: str) -> Dict[str, str]:
     - error: str or None
     """
     try:
-        # Create a new thread
-        thread = client.beta.threads.create()
-        thread_id = thread.id
-        
-        # Add user message to thread
-        client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=message
-        )
-        
-        # Create and run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=ASSISTANT_ID
-        )
+        # Create a thread with the user message and start the run in one call
+        run = await start_run(client, message)
+        thread_id = run.thread_id
         run_id = run.id
         
-        # Poll until completion
-        max_polls = 60  # 5 minutes max (5 second intervals)
-        poll_count = 0
+        # Poll until completion, backing off from 250ms up to 5s between polls
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RUN_TIMEOUT
+        poll_delay = POLL_MIN_DELAY
         
-        while poll_count < max_polls:
-            run_status = client.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run_id
-            )
+        while loop.time() < deadline:
+            run_status = await get_run(client, thread_id, run_id)
             
             if run_status.status == "completed":
-                # Get the assistant's messages
-                messages = client.beta.threads.messages.list(thread_id=thread_id)
+                # Get only the latest message produced by this run
+                messages = await get_latest_message(client, thread_id, run_id)
                 
-                # Find the latest assistant message
-                for msg in messages.data:
-                    if msg.role == "assistant":
-                        # Extract text from message content
-                        response_text = ""
-                        for content_block in msg.content:
-                            if content_block.type == "text":
-                                response_text += content_block.text.value
-                        
-                        return {
-                            "response": response_text.strip(),
-                            "thread_id": thread_id,
-                            "run_id": run_id,
-                            "status": "completed",
-                            "error": None
-                        }
+                if messages.data and messages.data[0].role == "assistant":
+                    msg = messages.data[0]
+                    
+                    # Extract text from message content
+                    response_text = "".join(
+                        content_block.text.value
+                        for content_block in msg.content
+                        if content_block.type == "text"
+                    )
+                    
+                    return {
+                        "response": response_text.strip(),
+                        "thread_id": thread_id,
+                        "run_id": run_id,
+                        "status": "completed",
+                        "error": None
+                    }
                 
                 # No assistant message found
                 return {
@@ -269,8 +353,8 @@ def call_assistant_api(message: str) -> Dict[str, str]:
                 }
             
             # Still processing, wait and poll again
-            time.sleep(5)
-            poll_count += 1
+            await asyncio.sleep(poll_delay)
+            poll_delay = min(poll_delay * POLL_BACKOFF, POLL_MAX_DELAY)
         
         # Timeout
         return {
@@ -278,80 +362,193 @@ def call_assistant_api(message: str) -> Dict[str, str]:
             "thread_id": thread_id,
             "run_id": run_id,
             "status": "timeout",
-            "error": "Run timed out after 5 minutes"
+            "error": f"Run timed out after {RUN_TIMEOUT} seconds"
         }
     
     except Exception as e:
-        # Let tenacity retry handle transient errors
+        # Transient errors were already retried per request; others propagate
         raise
 
 
-def load_processed_questions() -> set:
-    """Load already processed questions from outputs.csv for resume capability."""
-    if not OUTPUT_FILE.exists():
+def load_processed_questions(output_file: Path) -> set:
+    """Load already processed questions from the output CSV for resume capability."""
+    if not output_file.exists():
         return set()
     
-    processed = set()
-    with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            processed.add(row['question'])
+    with open(output_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return set()
+        
+        # Only the question column is needed; skip building a dict per row
+        question_idx = header.index('question')
+        processed = {row[question_idx] for row in reader if len(row) > question_idx}
     
     return processed
 
 
-def append_to_csv(record: Dict[str, str], result: Dict[str, str], prompt: str):
-    """Append a result row to outputs.csv."""
-    file_exists = OUTPUT_FILE.exists()
+def build_csv_row(
+    record: Dict[str, str],
+    result: Dict[str, str],
+    prompt: str
+) -> Tuple[str, ...]:
+    """Build an output CSV row in FIELDNAMES order."""
+    return (
+        record['topic'],
+        record['gender'],
+        record['care_focus'],
+        record['has_kids'],
+        record['role'],
+        prompt,
+        record['question'],
+        result['response'],
+        result['thread_id'],
+        result['run_id'],
+        result['status'],
+        result['error'] or ''
+    )
+
+
+def write_csv_rows(
+    csv_file: TextIO,
+    writer,
+    row_queue: queue.Queue,
+    errors: List[Exception],
+    stop_event: threading.Event
+):
+    """
+    Append rows from row_queue until a None sentinel arrives.
     
-    with open(OUTPUT_FILE, 'a', newline='', encoding='utf-8') as f:
-        fieldnames = [
-            'topic', 'gender', 'care_focus', 'has_kids', 'role',
-            'prompt', 'question', 'response', 'thread_id', 'run_id', 'status', 'error'
-        ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+    Runs in the writer thread; any write error is stored in errors so the
+    caller can re-raise it after joining the thread, and stop_event is set
+    so no new runs are started for rows that can't be saved.
+    """
+    try:
+        while True:
+            row = row_queue.get()
+            if row is None:
+                break
+            
+            writer.writerow(row)
+            
+            # Flush so completed rows survive an interruption (resume capability)
+            csv_file.flush()
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+
+
+async def process_record(
+    client: AsyncOpenAI,
+    record: Dict[str, str],
+    index: int,
+    total: int,
+    semaphore: asyncio.Semaphore,
+    row_queue: queue.Queue,
+    stop_event: threading.Event
+):
+    """Process a single record and queue its result row for the CSV writer."""
+    async with semaphore:
+        # Don't spend API calls once the batch has been asked to stop
+        if stop_event.is_set():
+            return
         
-        if not file_exists:
-            writer.writeheader()
+        print(f"Processing {index} of {total}: {record['question'][:60]}...")
         
-        writer.writerow({
-            'topic': record['topic'],
-            'gender': record['gender'],
-            'care_focus': record['care_focus'],
-            'has_kids': record['has_kids'],
-            'role': record['role'],
-            'prompt': prompt,
-            'question': record['question'],
-            'response': result['response'],
-            'thread_id': result['thread_id'],
-            'run_id': result['run_id'],
-            'status': result['status'],
-            'error': result['error'] or ''
-        })
-
-
-def main():
-    """Main batch processing function."""
-    # Validate that file paths are set
-    if INPUT_FILE is None or OUTPUT_FILE is None:
-        raise ValueError(
-            "INPUT_FILE and OUTPUT_FILE must be set before calling main(). "
-            "Use generate_answers.py as the entry point."
+        # Build message once; failed attempts record the same prompt
+        message = build_message(record)
+        
+        try:
+            result = await call_assistant_api(client, message)
+            
+            if result['status'] == 'completed':
+                print(f"  ✓ [{index}/{total}] Success (thread: {result['thread_id'][:8]}...)")
+            else:
+                print(f"  ✗ [{index}/{total}] Failed: {result['error']}")
+        
+        except Exception as e:
+            # Record failure and continue
+            print(f"  ✗ [{index}/{total}] Error: {str(e)}")
+            result = {
+                "response": "",
+                "thread_id": "",
+                "run_id": "",
+                "status": "failed",
+                "error": str(e)
+            }
+        
+        # Hand the row (with the prompt) to the writer thread
+        row_queue.put(build_csv_row(record, result, message))
+
+
+async def cancel_when_stopped(
+    batch: asyncio.Future,
+    stop_event: threading.Event,
+    cancel_event: Optional[threading.Event]
+):
+    """Cancel the batch once stop_event or the caller's cancel_event is set."""
+    while not (stop_event.is_set() or (cancel_event and cancel_event.is_set())):
+        await asyncio.sleep(POLL_MIN_DELAY)
+    
+    stop_event.set()
+    batch.cancel()
+
+
+async def process_records(
+    records: List[Dict[str, str]],
+    row_queue: queue.Queue,
+    stop_event: threading.Event,
+    cancel_event: Optional[threading.Event] = None
+):
+    """Process all records, running up to CONCURRENCY API calls at once."""
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    total = len(records)
+    
+    # One client per batch: its connection pool is bound to this event loop
+    async with AsyncOpenAI(api_key=OPENAI_API_KEY) as client:
+        batch = asyncio.gather(*[
+            process_record(client, record, i, total, semaphore, row_queue, stop_event)
+            for i, record in enumerate(records, 1)
+        ])
+        watcher = asyncio.ensure_future(
+            cancel_when_stopped(batch, stop_event, cancel_event)
         )
+        
+        try:
+            await batch
+        except asyncio.CancelledError:
+            # Stopped early on purpose; rows already queued are still written
+            if not stop_event.is_set():
+                raise
+        finally:
+            watcher.cancel()
+
+
+def main(
+    input_file: Path,
+    output_file: Path,
+    cancel_event: Optional[threading.Event] = None
+):
+    """
+    Process every question in input_file, appending results to output_file.
     
+    Setting cancel_event (e.g. from another thread on Ctrl-C) stops the batch
+    early, cancelling in-flight runs.
+    """
     print("=" * 60)
     print("Health Questions Batch Processor")
     print("=" * 60)
     print()
     
     # Parse input file
-    print(f"Reading questions from: {INPUT_FILE}")
-    records = parse_input_file(INPUT_FILE)
+    print(f"Reading questions from: {input_file}")
+    records = parse_input_file(input_file)
     print(f"Found {len(records)} questions to process")
     print()
     
     # Load already processed questions
-    processed_questions = load_processed_questions()
+    processed_questions = load_processed_questions(output_file)
     if processed_questions:
         print(f"Resuming: {len(processed_questions)} questions already processed")
         records = [r for r in records if r['question'] not in processed_questions]
@@ -362,45 +559,50 @@ def main():
         print("✓ All questions already processed!")
         return
     
-    # Process each record
-    total = len(records)
-    for i, record in enumerate(records, 1):
-        print(f"Processing {i} of {total}: {record['question'][:60]}...")
+    # Open the output CSV before any API calls so a bad path fails fast
+    write_header = not output_file.exists()
+    with open(output_file, 'a', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        if write_header:
+            writer.writerow(FIELDNAMES)
+            csv_file.flush()
+        
+        # A background thread does the writes so API calls never wait on disk
+        row_queue = queue.Queue()
+        writer_errors = []
+        stop_event = threading.Event()
+        writer_thread = threading.Thread(
+            target=write_csv_rows,
+            args=(csv_file, writer, row_queue, writer_errors, stop_event),
+            daemon=True
+        )
+        writer_thread.start()
         
         try:
-            # Build message and call API
-            message = build_message(record)
-            result = call_assistant_api(message)
-            
-            # Save to CSV with the prompt
-            append_to_csv(record, result, message)
-            
-            if result['status'] == 'completed':
-                print(f"  ✓ Success (thread: {result['thread_id'][:8]}...)")
-            else:
-                print(f"  ✗ Failed: {result['error']}")
+            # Process records concurrently
+            asyncio.run(process_records(records, row_queue, stop_event, cancel_event))
+        finally:
+            # Let the writer drain any queued rows, then stop
+            row_queue.put(None)
+            writer_thread.join()
         
-        except Exception as e:
-            # Record failure and continue
-            print(f"  ✗ Error: {str(e)}")
-            result = {
-                "response": "",
-                "thread_id": "",
-                "run_id": "",
-                "status": "failed",
-                "error": str(e)
-            }
-            # Build message for failed attempts too
-            message = build_message(record)
-            append_to_csv(record, result, message)
+        # Never report success for rows that weren't saved
+        if writer_errors:
+            raise writer_errors[0]
         
-        print()
+        if stop_event.is_set():
+            print(f"✗ Batch stopped early; partial results saved to: {output_file}")
+            return
     
     print("=" * 60)
     print(f"✓ Batch processing complete!")
-    print(f"Results saved to: {OUTPUT_FILE}")
+    print(f"Results saved to: {output_file}")
     print("=" * 60)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Batch process one topic file.")
+    parser.add_argument("input_file", type=Path, help="Topic file to read questions from")
+    parser.add_argument("output_file", type=Path, help="CSV file to append results to")
+    args = parser.parse_args()
+    main(args.input_file, args.output_file)